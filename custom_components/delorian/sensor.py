@@ -58,6 +58,9 @@ class Sensor(
     # SensorEntity: This is a sensor, obvious
     SensorEntity,
 ):
+    # Check for holes in the last week of statistics on each update
+    GAP_SCAN_HORIZON = timedelta(days=7)
+
     def __init__(self, *args, device_info: DeviceInfo, **kwargs):
         super().__init__()
 
@@ -92,6 +95,31 @@ class Sensor(
             start=datetime.now() - timedelta(days=3), step=timedelta(minutes=15)
         )
 
+        self._attr_historical_states = self._historical_states_from_upstream(
+            upstream_data
+        )
+        LOGGER.info("historical data updated from upstream")
+
+    async def async_update_historical_range(
+        self, start: datetime, end: datetime
+    ) -> list[HistoricalState]:
+        # Return HistoricalState's between `start` and `end`.
+        # Used by `HistoricalSensor` to refill holes found in stored statistics
+        # when `GAP_SCAN_HORIZON` is set.
+        #
+        # Important: start and end are in UTC, our API uses naive local datetimes
+
+        upstream_data = await self.api.fetch(
+            start=dtutil.as_local(start).replace(tzinfo=None),
+            end=dtutil.as_local(end).replace(tzinfo=None),
+            step=timedelta(minutes=15),
+        )
+
+        return self._historical_states_from_upstream(upstream_data)
+
+    def _historical_states_from_upstream(
+        self, upstream_data: list[tuple[datetime, float]]
+    ) -> list[HistoricalState]:
         upstream_data_with_timestamps = [
             (
                 dt.timestamp() if dt.tzinfo else dtutil.as_local(dt).timestamp(),
@@ -100,7 +128,7 @@ class Sensor(
             for (dt, state) in upstream_data
         ]
 
-        historical_states = [
+        return [
             HistoricalState(
                 state=state,
                 timestamp=ts,
@@ -108,9 +136,6 @@ class Sensor(
             for (ts, state) in upstream_data_with_timestamps
         ]
 
-        self._attr_historical_states = historical_states
-        LOGGER.info("historical data updated from upstream")
-
     def get_statistic_metadata(self) -> StatisticMetaData:
         #
         # Add sum and mean to base statistics metadata
@@ -16,13 +16,21 @@
 # USA.
 
 
-from .helpers import HistoricalState, group_by_interval, hass_get_last_statistic
+from .helpers import (
+    HistoricalState,
+    find_gaps,
+    group_by_interval,
+    hass_get_last_statistic,
+    hass_get_statistics_during_period,
+)
 from .sensor import HistoricalSensor  # , PollUpdateMixin
 
 __all__ = [
     "HistoricalSensor",
     "HistoricalState",
     # "PollUpdateMixin",
+    "find_gaps",
     "group_by_interval",
     "hass_get_last_statistic",
+    "hass_get_statistics_during_period",
 ]
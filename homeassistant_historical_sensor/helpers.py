@@ -5,6 +5,7 @@ import itertools
 import logging
 from collections.abc import Iterator
 from dataclasses import asdict, dataclass, field
+from datetime import datetime
 from math import ceil
 from typing import Any, Literal
 
@@ -13,6 +14,7 @@ from homeassistant.components.recorder.models import StatisticMetaData
 from homeassistant.components.recorder.statistics import (
     StatisticsRow,
     get_last_statistics,
+    statistics_during_period,
 )
 from homeassistant.core import HomeAssistant
 
@@ -75,3 +77,49 @@ async def hass_get_last_statistic(
         return None
 
     return res[statistics_metadata["statistic_id"]][0]
+
+
+async def hass_get_statistics_during_period(
+    hass: HomeAssistant,
+    statistics_metadata: StatisticMetaData,
+    start: datetime,
+    end: datetime | None = None,
+    *,
+    types: (
+        set[Literal["last_reset", "max", "mean", "min", "state", "sum"]] | None
+    ) = None,
+) -> list[StatisticsRow]:
+    if types is None:
+        types = {"last_reset", "max", "mean", "min", "state", "sum"}
+
+    res = await recorder.get_instance(hass).async_add_executor_job(
+        statistics_during_period,
+        hass,
+        start,
+        end,
+        {statistics_metadata["statistic_id"]},
+        "hour",
+        None,
+        types,
+    )
+
+    return res.get(statistics_metadata["statistic_id"], [])
+
+
+def find_gaps(
+    starts: list[float], *, granularity: int = 60 * 60
+) -> list[tuple[float, float]]:
+    """Find holes in a sorted list of statistic starts.
+
+    Only holes between the first and the last start are reported, the range
+    after the last start is handled by the regular forward import.
+
+    Returns a list of (start, end) tuples. `start` is the first missing block
+    and `end` is the start of the next present block.
+    """
+    gaps = []
+    for prev, curr in itertools.pairwise(starts):
+        if curr - prev > granularity:
+            gaps.append((prev + granularity, curr))
+
+    return gaps
@@ -0,0 +1,321 @@
+# Copyright (C) 2021-2023 Luis López <luis@cuarentaydos.com>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+
+import asyncio
+import contextlib
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import voluptuous as vol
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dtutil
+
+if TYPE_CHECKING:
+    from .sensor import HistoricalSensor
+
+LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "historical_sensor"
+SERVICE_PROFILE = "profile"
+
+ATTR_CYCLES = "cycles"
+ATTR_BLOCK_MONITOR = "block_monitor"
+ATTR_BLOCK_THRESHOLD = "block_threshold"
+
+PROFILES_DIRECTORY = "historical_sensor_profiles"
+
+DATA_SENSORS = f"{DOMAIN}_sensors"
+DATA_PROFILE_LOCK = f"{DOMAIN}_profile_lock"
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Optional(ATTR_CYCLES, default=1): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=10)
+        ),
+        vol.Optional(ATTR_BLOCK_MONITOR, default=False): cv.boolean,
+        vol.Optional(ATTR_BLOCK_THRESHOLD, default=0.1): vol.All(
+            vol.Coerce(float), vol.Range(min=0.001, max=5)
+        ),
+    }
+)
+
+
+@dataclass
+class ProfileRequest:
+    cycles: int
+    block_monitor: bool = False
+    block_threshold: float = 0.1
+
+
+@dataclass
+class LoopBlock:
+    duration: float
+    stack: str
+
+
+@dataclass
+class LoopBlockMonitor:
+    """Watch the event loop from a thread and record stacks of long blocks
+
+    Must be created from the event loop thread. stop() doesn't wait for the
+    thread, call join() outside the event loop for that.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    threshold: float
+    blocks: list[LoopBlock] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="historical_sensor_block_monitor", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def join(self) -> None:
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            pong = threading.Event()
+            t0 = time.monotonic()
+            self.loop.call_soon_threadsafe(pong.set)
+
+            if not pong.wait(self.threshold):
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                while not pong.wait(self.threshold) and not self._stop.is_set():
+                    pass
+
+                # Blocks still running on stop are caused by our caller
+                if self._stop.is_set():
+                    break
+
+                self.blocks.append(LoopBlock(time.monotonic() - t0, stack))
+
+            self._stop.wait(self.threshold)
+
+
+@callback
+def async_register_sensor(
+    hass: HomeAssistant, sensor: "HistoricalSensor"
+) -> Callable[[], None]:
+    """Make `sensor` available to the profile service
+
+    The service is registered along the first sensor and removed along the last
+    one. Returns a function to unregister the sensor.
+    """
+
+    sensors: dict[str, "HistoricalSensor"] = hass.data.setdefault(DATA_SENSORS, {})
+    sensors[sensor.entity_id] = sensor
+
+    if not hass.services.has_service(DOMAIN, SERVICE_PROFILE):
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_PROFILE,
+            functools.partial(_async_handle_profile, hass),
+            schema=PROFILE_SCHEMA,
+        )
+
+    @callback
+    def _unregister() -> None:
+        sensors.pop(sensor.entity_id, None)
+        if not sensors:
+            hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
+
+    return _unregister
+
+
+async def _async_handle_profile(hass: HomeAssistant, call: ServiceCall) -> None:
+    sensors: dict[str, "HistoricalSensor"] = hass.data.get(DATA_SENSORS, {})
+
+    missing = [x for x in call.data[ATTR_ENTITY_ID] if x not in sensors]
+    if missing:
+        raise ServiceValidationError(
+            f"{', '.join(missing)}: not historical sensors or not loaded"
+        )
+
+    for entity_id in call.data[ATTR_ENTITY_ID]:
+        sensors[entity_id]._historical_profile_request = ProfileRequest(
+            cycles=call.data[ATTR_CYCLES],
+            block_monitor=call.data[ATTR_BLOCK_MONITOR],
+            block_threshold=call.data[ATTR_BLOCK_THRESHOLD],
+        )
+        LOGGER.info(
+            f"{entity_id}: profiling next {call.data[ATTR_CYCLES]} update cycles"
+        )
+
+
+async def async_run_profiled(
+    sensor: "HistoricalSensor", fn: Callable[[], Awaitable[None]]
+) -> None:
+    """Run `fn` under cProfile and tracemalloc and write reports to disk
+
+    cProfile traces everything running in the event loop thread while `fn` is
+    running, not only `fn` itself. Profiled cycles are serialized since only
+    one profiler can be active at a time.
+    """
+
+    hass = sensor.hass
+    request = sensor._historical_profile_request
+    assert request is not None
+
+    request.cycles = request.cycles - 1
+    if request.cycles <= 0:
+        sensor._historical_profile_request = None
+
+    lock: asyncio.Lock = hass.data.setdefault(DATA_PROFILE_LOCK, asyncio.Lock())
+    async with lock:
+        # Everything started here must be torn down even if something fails to
+        # start, e.g. profiler.enable() raises if another profiler is active.
+        with contextlib.ExitStack() as stack:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                stack.callback(tracemalloc.stop)
+
+            # Snapshots are slow on big heaps, keep them out of the event loop
+            snapshot_before = await hass.async_add_executor_job(
+                tracemalloc.take_snapshot
+            )
+
+            monitor = None
+            if request.block_monitor:
+                monitor = LoopBlockMonitor(
+                    asyncio.get_running_loop(), request.block_threshold
+                )
+                monitor.start()
+                stack.callback(monitor.stop)
+
+            profiler = cProfile.Profile()
+            t0 = time.perf_counter()
+
+            try:
+                profiler.enable()
+            except ValueError as e:
+                LOGGER.warning(
+                    f"{sensor.entity_id}: unable to start profiler ({e}),"
+                    + " running update cycle without profiling"
+                )
+                sensor._historical_profile_request = None
+                stack.close()
+                await fn()
+                return
+
+            stack.callback(profiler.disable)
+
+            try:
+                await fn()
+
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - t0
+
+                if monitor:
+                    monitor.stop()
+                    await hass.async_add_executor_job(monitor.join)
+
+                snapshot_after = await hass.async_add_executor_job(
+                    tracemalloc.take_snapshot
+                )
+                stack.close()
+
+                timestamp = dtutil.utcnow().strftime("%Y%m%dT%H%M%S%f")
+                basename = Path(hass.config.path(PROFILES_DIRECTORY)) / (
+                    f"{sensor.entity_id}-{timestamp}"
+                )
+
+                # Profiling must never break the update cycle
+                try:
+                    await hass.async_add_executor_job(
+                        _write_reports,
+                        basename,
+                        profiler,
+                        snapshot_before,
+                        snapshot_after,
+                        monitor.blocks if monitor else None,
+                        elapsed,
+                    )
+                except OSError as e:
+                    LOGGER.warning(
+                        f"{sensor.entity_id}: unable to save profile reports"
+                        + f" to {basename}.* ({e})"
+                    )
+                else:
+                    LOGGER.info(
+                        f"{sensor.entity_id}: update cycle profiled in"
+                        + f" {elapsed:.3f}s, reports saved to {basename}.*"
+                    )
+
+
+def _write_reports(
+    basename: Path,
+    profiler: cProfile.Profile,
+    snapshot_before: tracemalloc.Snapshot,
+    snapshot_after: tracemalloc.Snapshot,
+    blocks: list[LoopBlock] | None,
+    elapsed: float,
+) -> None:
+    basename.parent.mkdir(parents=True, exist_ok=True)
+
+    profiler.dump_stats(f"{basename}.prof")
+
+    buff = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buff)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+    Path(f"{basename}.txt").write_text(f"elapsed: {elapsed:.3f}s\n\n{buff.getvalue()}")
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    diff = snapshot_after.filter_traces(filters).compare_to(
+        snapshot_before.filter_traces(filters), "lineno"
+    )
+    Path(f"{basename}.alloc.txt").write_text(
+        "\n".join(str(x) for x in diff[:50]) + "\n"
+    )
+
+    if blocks is not None:
+        Path(f"{basename}.blocks.txt").write_text(
+            "\n".join(
+                f"event loop blocked for {x.duration:.3f}s\n{x.stack}" for x in blocks
+            )
+            + "\n"
+        )
@@ -18,9 +18,10 @@
 
 import logging
 from abc import abstractmethod
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Any
 
+from homeassistant.components import recorder
 from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
 from homeassistant.components.recorder.statistics import (
     StatisticMeanType,
@@ -30,8 +31,15 @@ from homeassistant.components.recorder.statistics import (
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.const import STATE_UNKNOWN
 from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dtutil
 
-from .helpers import HistoricalState, hass_get_last_statistic
+from .helpers import (
+    HistoricalState,
+    find_gaps,
+    hass_get_last_statistic,
+    hass_get_statistics_during_period,
+)
+from .profiler import ProfileRequest, async_register_sensor, async_run_profiled
 
 LOGGER = logging.getLogger(__name__)
 
@@ -39,6 +47,17 @@ LOGGER = logging.getLogger(__name__)
 class HistoricalSensor(SensorEntity):
     UPDATE_INTERVAL = timedelta(seconds=30)
 
+    # Overrun count is a diagnostic, don't store it in the recorder
+    _unrecorded_attributes = frozenset({"historical_update_overruns"})
+
+    # Look for holes in stored statistics this far into the past. Disabled by
+    # default, sensors enabling it must implement async_update_historical_range()
+    GAP_SCAN_HORIZON: timedelta | None = None
+
+    # Gaps upstream can't fill are retried with an exponential backoff
+    GAP_RETRY_INTERVAL = timedelta(hours=1)
+    GAP_RETRY_MAX_INTERVAL = timedelta(days=1)
+
     """The HistoricalSensor class provides:
 
     - self.state
@@ -49,12 +68,32 @@ class HistoricalSensor(SensorEntity):
     Sensors based on HistoricalSensor must provide:
     - self._attr_historical_states
     - self.async_update_historical()
+
+    Sensors setting GAP_SCAN_HORIZON must provide:
+    - self.async_update_historical_range()
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._attr_historical_states: list[HistoricalState] = []
 
+        # Single-flight state for _async_historical_handle_update()
+        self._historical_update_running = False
+        self._historical_update_pending = False
+        self._historical_update_overruns = 0
+
+        # Gap repair state, see async_repair_statistics_gaps()
+        # (gap_start, gap_end) -> (attempts, retry_at)
+        self._historical_gap_attempts: dict[
+            tuple[float, float], tuple[int, float]
+        ] = {}
+        self._historical_gap_repair_unsupported = False
+        self._historical_gap_next_scan = 0.0
+
+        # Set by the historical_sensor.profile service
+        self._historical_profile_request: ProfileRequest | None = None
+        self._remove_profile_service_fn = None
+
     # @property
     # def state(self) -> Any:
     #     return STATE_UNKNOWN
@@ -66,6 +105,17 @@ class HistoricalSensor(SensorEntity):
 
         raise NotImplementedError()
 
+    @property
+    def historical_update_overruns(self) -> int:
+        """Number of update ticks received while a previous update was running"""
+        return self._historical_update_overruns
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        return (super().extra_state_attributes or {}) | {
+            "historical_update_overruns": self._historical_update_overruns
+        }
+
     @abstractmethod
     async def async_update_historical(self):
         """async_update_historical()
@@ -77,6 +127,19 @@ class HistoricalSensor(SensorEntity):
         """
         raise NotImplementedError()
 
+    async def async_update_historical_range(
+        self, start: datetime, end: datetime
+    ) -> list[HistoricalState]:
+        """async_update_historical_range()
+
+        This method should be implemented by sensors setting GAP_SCAN_HORIZON
+
+        Implement this async method to fetch historical data from provider between
+        `start` and `end` and return it. Unlike async_update_historical(), returned
+        states are not stored into self._attr_historical_states
+        """
+        raise NotImplementedError()
+
     async def async_added_to_hass(self) -> None:
         """Once added to hass:
         - Setup internal stuff with the Store to hold internal state
@@ -85,6 +148,8 @@ class HistoricalSensor(SensorEntity):
 
         await super().async_added_to_hass()
 
+        self._remove_profile_service_fn = async_register_sensor(self.hass, self)
+
         ## Ensure that statistics are OK.
         # unit_class and unit_of_measurement fields are required for some
         # functions like the energy panel.
@@ -122,8 +187,61 @@ class HistoricalSensor(SensorEntity):
         if self._remove_time_tracker_fn:
             self._remove_time_tracker_fn()
 
+        # Don't run a coalesced update after removal
+        self._historical_update_pending = False
+
+        if self._remove_profile_service_fn:
+            self._remove_profile_service_fn()
+
     async def _async_historical_handle_update(self, _=None) -> None:
+        # Only one update cycle runs at a time. Ticks received while a cycle is
+        # running are coalesced into a single follow-up cycle.
+        if self._historical_update_running:
+            # Only warn on the first overrun of each cycle, the count is
+            # available in historical_update_overruns
+            log_fn = LOGGER.debug if self._historical_update_pending else LOGGER.warning
+
+            self._historical_update_pending = True
+            self._historical_update_overruns = self._historical_update_overruns + 1
+            log_fn(
+                f"{self.entity_id}: previous update still running, "
+                + f"{self._historical_update_overruns} overruns "
+                + f"(update interval: {self.UPDATE_INTERVAL.total_seconds()} seconds)"
+            )
+            return
+
+        overruns = self._historical_update_overruns
+        self._historical_update_running = True
+        try:
+            while True:
+                self._historical_update_pending = False
+                if self._historical_profile_request is not None:
+                    await async_run_profiled(self, self._async_historical_update_cycle)
+                else:
+                    await self._async_historical_update_cycle()
+                if not self._historical_update_pending:
+                    break
+
+                LOGGER.debug(f"{self.entity_id}: running coalesced update")
+
+        finally:
+            self._historical_update_running = False
+
+            # Publish the new overrun count once per cycle, not on each tick
+            if self._historical_update_overruns != overruns:
+                self.async_write_ha_state()
+
+    async def _async_historical_update_cycle(self) -> None:
         await self.async_update_historical()
+
+        # Repair gaps before the forward write so it builds on shifted sums.
+        # Repair is best effort, it must never block new imports.
+        if self.GAP_SCAN_HORIZON is not None:
+            try:
+                await self.async_repair_statistics_gaps(self.GAP_SCAN_HORIZON)
+            except Exception:
+                LOGGER.exception(f"{self.entity_id}: unable to repair gaps")
+
         await self.async_write_historical()
 
     async def async_write_historical(self):
@@ -179,6 +297,200 @@ class HistoricalSensor(SensorEntity):
 
         return statistics_data
 
+    async def async_repair_statistics_gaps(
+        self, horizon: timedelta
+    ) -> list[StatisticData]:
+        """async_repair_statistics_gaps()
+
+        Look for holes in the statistics stored in the last `horizon` and refetch
+        only the missing ranges using async_update_historical_range()
+
+        Stored statistics are scanned at most once per GAP_RETRY_INTERVAL.
+
+        Sums of the statistics after a repaired hole are shifted by the repaired
+        amount, it assumes those statistics never accounted the missing hours
+        (i.e. upstream outages or failed imports). Holes left by statistics
+        deleted after being imported would be accounted twice.
+        """
+
+        if self._historical_gap_repair_unsupported:
+            return []
+
+        if (
+            type(self).async_update_historical_range
+            is HistoricalSensor.async_update_historical_range
+        ):
+            LOGGER.warning(
+                f"{self.entity_id}: GAP_SCAN_HORIZON is set but"
+                + " async_update_historical_range() is not implemented,"
+                + " gap repair disabled"
+            )
+            self._historical_gap_repair_unsupported = True
+            return []
+
+        now = dtutil.utcnow().timestamp()
+        if now < self._historical_gap_next_scan:
+            return []
+
+        self._historical_gap_next_scan = (
+            now + self.GAP_RETRY_INTERVAL.total_seconds()
+        )
+
+        #
+        # Include the block just before the horizon. It anchors holes crossing
+        # the horizon start, without it they would be leading holes and never
+        # be detected.
+        #
+
+        granularity = 60 * 60
+        horizon_start = (dtutil.utcnow() - horizon).timestamp()
+        horizon_start = horizon_start - horizon_start % granularity
+
+        statistics_metadata = self.get_statistic_metadata()
+        stored = await hass_get_statistics_during_period(
+            self.hass,
+            statistics_metadata,
+            dtutil.utc_from_timestamp(horizon_start - granularity),
+        )
+
+        gaps = find_gaps([x["start"] for x in stored], granularity=granularity)
+
+        # Forget attempts for gaps already gone
+        attempts = {
+            k: v for k, v in self._historical_gap_attempts.items() if k in gaps
+        }
+        self._historical_gap_attempts = attempts
+
+        if not gaps:
+            return []
+
+        LOGGER.debug(f"{self.entity_id}: {len(gaps)} gaps found in statistics")
+
+        #
+        # Fetch and calculate each gap from the row just before it.
+        # If sum is tracked, rows after each gap must be shifted with the amount
+        # added by the repair.
+        # Gaps upstream can't fill are retried with an exponential backoff.
+        #
+
+        repaired = []
+        n_repaired_gaps = 0
+        offset = 0.0
+        offsets: list[tuple[float, float]] = []
+
+        for gap_start, gap_end in gaps:
+            n_attempts, retry_at = attempts.get((gap_start, gap_end), (0, 0.0))
+            if now < retry_at:
+                continue
+
+            previous = [x for x in stored if x["start"] < gap_start][-1]
+            if statistics_metadata.get("has_sum") and previous.get("sum") is not None:
+                previous = previous | {"sum": previous["sum"] + offset}
+
+            error = None
+            statistics_data = []
+            try:
+                hist_states = await self.async_update_historical_range(
+                    dtutil.utc_from_timestamp(gap_start),
+                    dtutil.utc_from_timestamp(gap_end),
+                )
+
+                # Block S holds states in (S, S + granularity], see blockize()
+                hist_states = sorted(
+                    [x for x in hist_states if gap_start < x.timestamp <= gap_end],
+                    key=lambda x: x.timestamp,
+                )
+
+                if hist_states:
+                    statistics_data = await self.async_calculate_statistic_data(
+                        hist_states, latest=previous
+                    )
+                    statistics_data = [
+                        x
+                        for x in statistics_data
+                        if gap_start <= x["start"].timestamp() < gap_end
+                    ]
+
+            except Exception as e:
+                error = e
+
+            if not statistics_data:
+                n_attempts = n_attempts + 1
+                delay = min(
+                    self.GAP_RETRY_INTERVAL * 2 ** (n_attempts - 1),
+                    self.GAP_RETRY_MAX_INTERVAL,
+                )
+                attempts[(gap_start, gap_end)] = (
+                    n_attempts,
+                    now + delay.total_seconds(),
+                )
+
+                reason = f"error ({error!r})" if error else "no upstream data"
+                log_fn = LOGGER.warning if n_attempts == 1 else LOGGER.debug
+                log_fn(
+                    f"{self.entity_id}: {reason} for gap"
+                    + f" {dtutil.utc_from_timestamp(gap_start)}"
+                    + f" - {dtutil.utc_from_timestamp(gap_end)},"
+                    + f" retrying in {delay} (attempt {n_attempts})"
+                )
+                continue
+
+            attempts.pop((gap_start, gap_end), None)
+
+            if (
+                statistics_metadata.get("has_sum")
+                and previous.get("sum") is not None
+                and statistics_data[-1].get("sum") is not None
+            ):
+                offset = offset + statistics_data[-1]["sum"] - previous["sum"]
+                offsets.append((gap_end, offset))
+
+            repaired.extend(statistics_data)
+            n_repaired_gaps = n_repaired_gaps + 1
+
+        if not repaired:
+            return []
+
+        #
+        # Shift sums of already stored rows after each repaired gap
+        #
+
+        shifted = []
+        for row in stored:
+            row_offset = next(
+                (o for (ts, o) in reversed(offsets) if row["start"] >= ts), 0.0
+            )
+            if not row_offset or row.get("sum") is None:
+                continue
+
+            shifted.append(
+                StatisticData(
+                    {
+                        k: v
+                        for k, v in row.items()
+                        if k in ("mean", "min", "max", "state") and v is not None
+                    },
+                    start=dtutil.utc_from_timestamp(row["start"]),
+                    sum=row["sum"] + row_offset,
+                )
+            )
+            if row.get("last_reset") is not None:
+                shifted[-1]["last_reset"] = dtutil.utc_from_timestamp(
+                    row["last_reset"]
+                )
+
+        async_add_external_statistics(
+            self.hass, statistics_metadata, repaired + shifted
+        )
+        await recorder.get_instance(self.hass).async_block_till_done()
+
+        LOGGER.info(
+            f"{self.entity_id}: repaired {len(repaired)} statistics points"
+            + f" in {n_repaired_gaps} gaps, shifted {len(shifted)} statistics points"
+        )
+
+        return repaired
+
     def get_statistic_metadata(self) -> StatisticMetaData:
         metadata = StatisticMetaData(
             # has_mean=False,